@@ -1,5 +1,4 @@
 import asyncio
-import json
 import os
 import logging
 import time
@@ -7,10 +6,20 @@ import random
 from tqdm import tqdm
 from datetime import timedelta
 import csv
+import functools
+from contextlib import ExitStack
+from itertools import islice
+from operator import attrgetter, itemgetter
 
+import httpx
+import orjson
 from twikit import Client
 from dotenv import load_dotenv
 from twikit.errors import Unauthorized, AccountSuspended, TooManyRequests, UserNotFound, UserUnavailable, BadRequest, TwitterException
+try:
+    import uvloop  # faster event loop, not available on Windows
+except ImportError:
+    uvloop = None
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -18,17 +27,45 @@ load_dotenv()
 # Configuration Constants
 MAX_RETRIES = 5
 INITIAL_WAIT_TIME = 60  # seconds
-SLEEP_BETWEEN_USERS_MIN = 15
-SLEEP_BETWEEN_USERS_MAX = 30
+CONCURRENCY = 8  # number of users fetched at the same time
 TWEET_LIMIT = 200
 HIGHLIGHT_TWEET_LIMIT = 200
 FETCH_COUNT = 200
 COOKIES_FILE = 'cookies.json'
-OUTPUT_FILE = 'twitter_profiles_data.json'
+USERNAMES_FILE = 'usernames.txt'
+DONE_FILE = 'done.jsonl'  # checkpoint of the users that were already fetched
+USER_ID_CACHE_FILE = 'user_id_cache.json'
+USER_ID_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # seconds, an older cache file is ignored
+USER_ID_CACHE_SAVE_INTERVAL = 50  # save the cache after this many new entries
+USERS_JSONL_FILE = 'users.jsonl'
+TWEETS_JSONL_FILE = 'tweets.jsonl'
+HIGHLIGHT_TWEETS_JSONL_FILE = 'highlight_tweets.jsonl'
 USERS_CSV_FILE = 'users.csv'
 TWEETS_CSV_FILE = 'tweets.csv'
 HIGHLIGHT_TWEETS_CSV_FILE = 'highlight_tweets.csv'
 BACKOFF_FACTOR = 2.5
+MAX_KEEPALIVE_CONNECTIONS = 64
+MAX_CONNECTIONS = 128
+HTTP_TIMEOUT = 30  # seconds
+SAVE_JSONL = True  # also save the results as JSON Lines next to the CSV files
+
+# Tweet attributes copied into each output row, and the keys they are saved under
+_TWEET_ATTRS = ('full_text', 'created_at', 'retweet_count', 'favorite_count', 'reply_count', 'quote_count',
+                'view_count', 'view_count_state', 'lang', 'is_quote_status', 'possibly_sensitive',
+                'is_edit_eligible', 'edits_remaining')
+_TWEET_KEYS = ('text',) + _TWEET_ATTRS[1:]
+_TWEET_GETTER = attrgetter(*_TWEET_ATTRS)
+
+# Output fields, used both to build the rows and as the CSV header rows
+USER_FIELDS = ('id', 'name', 'screen_name', 'created_at', 'description', 'location', 'url', 'profile_image_url',
+               'protected', 'is_blue_verified', 'followers_count', 'statuses_count', 'listed_count',
+               'profile_banner_url', 'description_urls', 'urls', 'pinned_tweet_ids', 'verified',
+               'possibly_sensitive', 'can_dm', 'can_media_tag', 'want_retweets', 'default_profile',
+               'default_profile_image', 'has_custom_timelines', 'fast_followers_count', 'normal_followers_count',
+               'favourites_count', 'media_count', 'is_translator', 'translator_type', 'profile_interstitial_type',
+               'withheld_in_countries')
+TWEET_FIELDS = ('tweet_id', 'user_id') + _TWEET_KEYS
+HIGHLIGHT_TWEET_FIELDS = TWEET_FIELDS
 
 # Configure logging
 # File Logger
@@ -43,8 +80,116 @@ console_formatter = logging.Formatter('%(message)s')
 console_handler.setFormatter(console_formatter)
 console_logger.addHandler(console_handler)
 
+class RateLimit:
+    """Request budget of one API endpoint, as advertised by Twitter's rate limit headers."""
+
+    def __init__(self):
+        self.remaining = None  # unknown until the first response
+        self.reset = 0  # unix time at which the budget is refilled
+
+    async def acquire(self):
+        """Takes one request from the budget, waiting for the reset time if it is used up."""
+        while self.remaining is not None and self.remaining <= 0:
+            wait_time = self.reset - time.time()
+            if wait_time <= 0:
+                self.remaining = None
+                break
+            logging.info(f"Rate limit budget used up. Waiting {wait_time:.0f} seconds for it to reset...")
+            await asyncio.sleep(wait_time)
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def update(self, remaining, reset):
+        """Updates the budget from the values the server sent back."""
+        if reset > self.reset:
+            # A new window started, so the server's count replaces ours
+            self.reset = reset
+            self.remaining = remaining
+        elif self.remaining is not None:
+            # Requests still in flight are not counted by the server yet
+            self.remaining = min(self.remaining, remaining)
+
+    def exhaust(self, reset):
+        """Marks the budget as used up until the given reset time."""
+        self.reset = max(self.reset, reset)
+        self.remaining = 0
+
+class RateLimitedClient(Client):
+    """twikit client that waits for an endpoint's rate limit to reset instead of running into it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rate_limits = {}
+
+    async def request(self, method, url, *args, **kwargs):
+        rate_limit = self._rate_limits.setdefault(url.split('?')[0], RateLimit())
+        await rate_limit.acquire()
+        try:
+            response_data, response = await super().request(method, url, *args, **kwargs)
+        except TooManyRequests as e:
+            reset = getattr(e, 'rate_limit_reset', None)
+            if reset:
+                rate_limit.exhaust(int(reset))
+            raise
+        remaining = response.headers.get('x-rate-limit-remaining')
+        reset = response.headers.get('x-rate-limit-reset')
+        if remaining is not None and reset is not None:
+            rate_limit.update(int(remaining), int(reset))
+        return response_data, response
+
+class UserIdCache:
+    """Screen name to user ID mapping kept between runs, so known users' tweets can be fetched before their profile arrives."""
+
+    def __init__(self, filepath, max_age, save_interval):
+        self.filepath = filepath
+        self.max_age = max_age
+        self.save_interval = save_interval
+        self._user_ids = {}
+        self._unsaved = 0
+
+    def load(self):
+        """Loads the cache file, unless it is missing, unreadable or older than max_age."""
+        try:
+            if time.time() - os.path.getmtime(self.filepath) > self.max_age:
+                logging.info(f"User ID cache '{self.filepath}' is too old, starting a new one.")
+                return
+            with open(self.filepath, 'rb') as f:
+                self._user_ids = orjson.loads(f.read())
+            logging.info(f"Loaded {len(self._user_ids)} user IDs from '{self.filepath}'.")
+        except FileNotFoundError:
+            pass
+        except (OSError, orjson.JSONDecodeError) as e:
+            logging.error(f"Could not load user ID cache '{self.filepath}': {e}")
+
+    def save(self):
+        """Writes the cache file, replacing the old one only once the new one is complete."""
+        if not self._unsaved:
+            return
+        tmp_filepath = self.filepath + '.tmp'
+        with open(tmp_filepath, 'wb') as f:
+            f.write(orjson.dumps(self._user_ids))
+        os.replace(tmp_filepath, self.filepath)
+        self._unsaved = 0
+
+    def get(self, username):
+        return self._user_ids.get(username.lower())
+
+    def set(self, username, user_id):
+        if self._user_ids.get(username.lower()) == user_id:
+            return
+        self._user_ids[username.lower()] = user_id
+        self._unsaved += 1
+        if self._unsaved >= self.save_interval:
+            self.save()
+
+
 # Initialize client
-client = Client('en-US')
+# twikit passes extra keyword arguments to the httpx.AsyncClient it keeps for all requests,
+# so connections are pooled, kept alive and multiplexed over HTTP/2
+client = RateLimitedClient('en-US', http2=True,
+                           limits=httpx.Limits(max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS, max_connections=MAX_CONNECTIONS),
+                           timeout=HTTP_TIMEOUT)
+user_id_cache = UserIdCache(USER_ID_CACHE_FILE, USER_ID_CACHE_MAX_AGE, USER_ID_CACHE_SAVE_INTERVAL)
 
 async def login_and_load_cookies():
     try:
@@ -63,10 +208,42 @@ async def login_and_load_cookies():
         return False
     return True
 
+def async_retry(exc=TooManyRequests, max_retries=MAX_RETRIES, initial_wait=INITIAL_WAIT_TIME, factor=BACKOFF_FACTOR, description=None):
+    """Retries a coroutine function with exponential backoff while it raises exc.
+
+    Args:
+        exc: The exception (or tuple of exceptions) that triggers a retry.
+        max_retries: The maximum number of attempts. The last exception is re-raised after that.
+        initial_wait: Seconds to wait before the first retry.
+        factor: How much the wait time grows after every retry.
+        description: Prefix for the log messages, defaults to the function name.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            wait_time = initial_wait
+            for attempt in range(1, max_retries + 1):
+                try:
+                    return await fn(*args, **kwargs)
+                except exc:
+                    if attempt == max_retries:
+                        raise
+                    logging.warning(f"{description or fn.__name__} - Rate limit exceeded. Retrying in {wait_time:.0f} seconds... {attempt} retries done")
+                    await asyncio.sleep(wait_time)
+                    # Multiplicative jitter keeps the wait positive and growing while spreading out retries
+                    wait_time = max(5.0, wait_time * factor * (0.9 + 0.2 * random.random()))
+        return wrapper
+    return decorator
+
 async def fetch_user_profile(username):
+    get_user_by_screen_name = async_retry(description=f"User: {username} - Fetching profile")(client.get_user_by_screen_name)
     try:
-        user_profile = await client.get_user_by_screen_name(username)
+        user_profile = await get_user_by_screen_name(username)
+        user_id_cache.set(username, user_profile.id)
         return user_profile
+    except TooManyRequests:
+        logging.error(f"User: {username} - Rate limit still exceeded after {MAX_RETRIES} attempts when fetching user profile")
+        return None
     except (UserNotFound, UserUnavailable, BadRequest, AccountSuspended) as e:
         logging.error(f"User: {username} - Error fetching user profile: {e}")
         return None
@@ -74,113 +251,59 @@ async def fetch_user_profile(username):
         logging.error(f"User: {username} - An unexpected error occurred while fetching user: {e}")
         return None
 
-async def fetch_tweets_with_cursor(user_id, tweet_type, limit):
-    """Fetches tweets using cursor-based pagination."""
-    all_tweets = []
+async def _paginate(page_fn, user_id, limit, label):
+    """Fetches tweets page by page using cursor-based pagination.
+
+    Args:
+        page_fn: Coroutine function called as page_fn(count, cursor) that returns one page of tweets.
+        user_id: The ID of the user the tweets belong to.
+        limit: The maximum number of tweets to fetch.
+        label: What is being fetched, used in log messages.
+
+    Raises:
+        TwitterException: If a page could not be fetched, including TooManyRequests once retries run out.
+    """
+    fetch_page = async_retry(description=f"User ID: {user_id} - Fetching {label}")(page_fn)
+    all_tweets = [None] * limit  # Filled by index, so the list never has to grow
+    fetched = 0
     cursor = None
-    retries = 0
-    wait_time = INITIAL_WAIT_TIME
-    while len(all_tweets) < limit and retries < MAX_RETRIES:
+    while fetched < limit:
         try:
-            # Use client.get_user_tweets with the user_id
-            result = await client.get_user_tweets(user_id=user_id, tweet_type=tweet_type, count=min(FETCH_COUNT, limit - len(all_tweets)), cursor=cursor)
-            if not result:
-                break
-            for tweet in result:
-                all_tweets.append({
-                    'tweet_id': tweet.id,
-                    'user_id': user_id,
-                    'text': tweet.full_text,
-                    'created_at': tweet.created_at,
-                    'retweet_count': tweet.retweet_count,
-                    'favorite_count': tweet.favorite_count,
-                    'reply_count': tweet.reply_count,
-                    'quote_count': tweet.quote_count,
-                    'view_count': tweet.view_count,
-                    'view_count_state': tweet.view_count_state,
-                    'lang': tweet.lang,
-                    'is_quote_status': tweet.is_quote_status,
-                    'possibly_sensitive': tweet.possibly_sensitive,
-                    'is_edit_eligible': tweet.is_edit_eligible,
-                    'edits_remaining': tweet.edits_remaining
-                })
-                if len(all_tweets) >= limit:
-                    break
-            if len(all_tweets) >= limit:
-                break
-            cursor = result.next_cursor
-            if not cursor:
-              break
-            retries = 0 # reset retries if successful
-            wait_time = INITIAL_WAIT_TIME # reset the wait time
-            await asyncio.sleep(random.uniform(1,3))  # Add a small delay between each API call
+            result = await fetch_page(min(FETCH_COUNT, limit - fetched), cursor)
         except TooManyRequests:
-            logging.warning(f"User ID: {user_id} - Rate limit exceeded when fetching tweets. Retrying in {wait_time} seconds... {retries + 1} retries done")
-            retries += 1
-            try:
-                await asyncio.wait_for(asyncio.sleep(wait_time), timeout=wait_time + 10)
-            except asyncio.TimeoutError:
-                logging.error("asyncio.sleep() timed out!")
-            wait_time = wait_time * BACKOFF_FACTOR + random.uniform(-5, 5)
+            logging.error(f"User ID: {user_id} - Rate limit still exceeded after {MAX_RETRIES} attempts when fetching {label}")
+            raise
         except TwitterException as e:
-            logging.error(f"User ID: {user_id} - Error fetching tweets: {e}")
+            logging.error(f"User ID: {user_id} - Error fetching {label}: {e}")
+            raise
+        if not result:
             break
+        # islice stops at the limit, so the loop body needs no bounds check
+        for tweet in islice(result, limit - fetched):
+            row = {'tweet_id': tweet.id, 'user_id': user_id}
+            row.update(zip(_TWEET_KEYS, _TWEET_GETTER(tweet)))
+            all_tweets[fetched] = row
+            fetched += 1
+        if fetched >= limit:
+            break
+        cursor = result.next_cursor
+        if not cursor:
+            break
+        await asyncio.sleep(random.uniform(1,3))  # Add a small delay between each API call
 
-    return all_tweets
+    return all_tweets[:fetched]
+
+async def fetch_tweets_with_cursor(user_id, tweet_type, limit):
+    """Fetches tweets using cursor-based pagination."""
+    return await _paginate(
+        lambda count, cursor: client.get_user_tweets(user_id=user_id, tweet_type=tweet_type, count=count, cursor=cursor),
+        user_id, limit, 'tweets')
 
 async def fetch_highlight_tweets_with_cursor(user_id, limit):
     """Fetches highlight tweets using cursor-based pagination."""
-    all_tweets = []
-    cursor = None
-    retries = 0
-    wait_time = INITIAL_WAIT_TIME
-    while len(all_tweets) < limit and retries < MAX_RETRIES:
-        try:
-            # Use client.get_user_highlights_tweets with the user_id
-            result = await client.get_user_highlights_tweets(user_id=user_id, count=min(FETCH_COUNT, limit - len(all_tweets)), cursor=cursor)
-            if not result:
-              break
-            for tweet in result:
-                all_tweets.append({
-                    'tweet_id': tweet.id,
-                    'user_id': user_id,
-                    'text': tweet.full_text,
-                    'created_at': tweet.created_at,
-                    'retweet_count': tweet.retweet_count,
-                    'favorite_count': tweet.favorite_count,
-                    'reply_count': tweet.reply_count,
-                    'quote_count': tweet.quote_count,
-                    'view_count': tweet.view_count,
-                    'view_count_state': tweet.view_count_state,
-                    'lang': tweet.lang,
-                    'is_quote_status': tweet.is_quote_status,
-                    'possibly_sensitive': tweet.possibly_sensitive,
-                    'is_edit_eligible': tweet.is_edit_eligible,
-                    'edits_remaining': tweet.edits_remaining
-                })
-                if len(all_tweets) >= limit:
-                    break
-            if len(all_tweets) >= limit:
-                break
-            cursor = result.next_cursor
-            if not cursor:
-               break
-            retries = 0 # reset retries if successful
-            wait_time = INITIAL_WAIT_TIME
-            await asyncio.sleep(random.uniform(1,3))  # Add a small delay between each API call
-        except TooManyRequests:
-            logging.warning(f"User ID: {user_id} - Rate limit exceeded when fetching highlight tweets. Retrying in {wait_time} seconds... {retries + 1} retries done")
-            retries += 1
-            try:
-                await asyncio.wait_for(asyncio.sleep(wait_time), timeout=wait_time + 10)
-            except asyncio.TimeoutError:
-                logging.error("asyncio.sleep() timed out!")
-            wait_time = wait_time * BACKOFF_FACTOR + random.uniform(-5, 5)
-        except TwitterException as e:
-            logging.error(f"User ID: {user_id} - Error fetching highlight tweets: {e}")
-            break
-
-    return all_tweets
+    return await _paginate(
+        lambda count, cursor: client.get_user_highlights_tweets(user_id=user_id, count=count, cursor=cursor),
+        user_id, limit, 'highlight tweets')
 
 async def fetch_tweet_data(user_id, tweet_type, limit):
     """Fetches tweet data for a given user profile."""
@@ -192,107 +315,117 @@ async def fetch_highlight_tweet_data(user_id, limit):
     all_tweets = await fetch_highlight_tweets_with_cursor(user_id, limit)
     return all_tweets
 
-async def fetch_user_details_data(user_profile):
+def fetch_user_details_data(user_profile):
     """Fetches detailed information about a user."""
     try:
-        return {
-            'id': getattr(user_profile, 'id', 'N/A'),
-            'name': getattr(user_profile, 'name', 'N/A'),
-            'screen_name': getattr(user_profile, 'screen_name', 'N/A'),
-            'created_at': getattr(user_profile, 'created_at', 'N/A'),
-            'description': getattr(user_profile, 'description', 'N/A'),
-            'location': getattr(user_profile, 'location', 'N/A'),
-            'url': getattr(user_profile, 'url', 'N/A'),
-            'profile_image_url': getattr(user_profile, 'profile_image_url', 'N/A'),
-            'protected': getattr(user_profile, 'protected', 'N/A'),
-            'is_blue_verified': getattr(user_profile, 'is_blue_verified', 'N/A'),
-            'followers_count': getattr(user_profile, 'followers_count', 'N/A'),
-            'statuses_count': getattr(user_profile, 'statuses_count', 'N/A'),
-            'listed_count': getattr(user_profile, 'listed_count', 'N/A'),
-            'profile_banner_url': getattr(user_profile, 'profile_banner_url', 'N/A'),
-            'description_urls': getattr(user_profile, 'description_urls', 'N/A'),
-            'urls': getattr(user_profile, 'urls', 'N/A'),
-            'pinned_tweet_ids': getattr(user_profile, 'pinned_tweet_ids', 'N/A'),
-            'verified': getattr(user_profile, 'verified', 'N/A'),
-            'possibly_sensitive': getattr(user_profile, 'possibly_sensitive', 'N/A'),
-            'can_dm': getattr(user_profile, 'can_dm', 'N/A'),
-            'can_media_tag': getattr(user_profile, 'can_media_tag', 'N/A'),
-            'want_retweets': getattr(user_profile, 'want_retweets', 'N/A'),
-            'default_profile': getattr(user_profile, 'default_profile', 'N/A'),
-            'default_profile_image': getattr(user_profile, 'default_profile_image', 'N/A'),
-            'has_custom_timelines': getattr(user_profile, 'has_custom_timelines', 'N/A'),
-            'fast_followers_count': getattr(user_profile, 'fast_followers_count', 'N/A'),
-            'normal_followers_count': getattr(user_profile, 'normal_followers_count', 'N/A'),
-            'favourites_count': getattr(user_profile, 'favourites_count', 'N/A'),
-            'media_count': getattr(user_profile, 'media_count', 'N/A'),
-            'is_translator': getattr(user_profile, 'is_translator', 'N/A'),
-            'translator_type': getattr(user_profile, 'translator_type', 'N/A'),
-            'profile_interstitial_type': getattr(user_profile, 'profile_interstitial_type', 'N/A'),
-            'withheld_in_countries': getattr(user_profile, 'withheld_in_countries', 'N/A'),
-        }
+        # twikit does not set every field (e.g. profile_interstitial_type), so missing ones get a default
+        return {field: getattr(user_profile, field, 'N/A') for field in USER_FIELDS}
     except Exception as e:
         logging.error(f"Error fetching details for {user_profile.screen_name}: {e}")
         return {}
 
+async def fetch_all_tweet_data(user_id):
+    """Fetches the tweets and highlight tweets of a user, returning any exception instead of raising it."""
+    # Tweets and highlights come from independent endpoints, so fetch them at the same time
+    return await asyncio.gather(
+        fetch_tweet_data(user_id, 'Tweets', TWEET_LIMIT),
+        fetch_highlight_tweet_data(user_id, HIGHLIGHT_TWEET_LIMIT),
+        return_exceptions=True,
+    )
+
 async def fetch_user_data(username):
     logging.info(f"Fetching data for user: {username}")
-    user_profile = await fetch_user_profile(username)
+    cached_user_id = user_id_cache.get(username)
+    if cached_user_id:
+        # With a known ID the tweets don't have to wait for the profile, which saves a round trip
+        user_profile, (tweets, highlight_tweets) = await asyncio.gather(
+            fetch_user_profile(username),
+            fetch_all_tweet_data(cached_user_id),
+        )
+    else:
+        user_profile = await fetch_user_profile(username)
     if not user_profile:
         return None
 
-    user_details = await fetch_user_details_data(user_profile)
-    tweets = await fetch_tweet_data(user_profile.id, 'Tweets', TWEET_LIMIT)
-    highlight_tweets = await fetch_highlight_tweet_data(user_profile.id, HIGHLIGHT_TWEET_LIMIT)
+    if user_profile.id != cached_user_id:
+        if cached_user_id:
+            # The screen name now belongs to another account, so the tweets fetched above are of the wrong user
+            logging.info(f"User: {username} - Cached user ID {cached_user_id} is outdated, fetching tweets of {user_profile.id}")
+        tweets, highlight_tweets = await fetch_all_tweet_data(user_profile.id)
+
+    user_details = fetch_user_details_data(user_profile)
+    errors = [e for e in (tweets, highlight_tweets) if isinstance(e, Exception)]
+    if errors:
+        # Partial results are dropped, so the user stays out of the checkpoint and is fetched again on the next run
+        logging.error(f"User: {username} - Tweets could not be fetched completely, skipping user: {errors[0]}")
+        return None
 
     return user_details, tweets, highlight_tweets
 
+async def try_fetch_user_data(username, progress_bar):
+    """Fetches data for a user, logging unexpected errors instead of raising them."""
+    try:
+        return await fetch_user_data(username)
+    except Exception as e:
+        progress_bar.set_description(f"Error: {username}")
+        logging.error(f"User: {username} - An unexpected error occurred while fetching data: {e}")
+    return None
+
 def format_time(seconds):
     return str(timedelta(seconds=int(seconds)))
 
-def write_data_to_csv(filepath, data, header):
-    """Writes data to a CSV file.
+def iter_usernames(filepath):
+    """Yields the non-empty usernames of a file one at a time."""
+    with open(filepath, 'r') as f:
+        for line in f:
+            username = line.strip()
+            if username:
+                yield username
+
+def open_csv_writer(stack, filepath, header, mode='w'):
+    """Opens a CSV file for writing and writes its header row if the file is empty.
 
     Args:
+        stack: The ExitStack that closes the file.
         filepath: The path to the CSV file.
-        data: A list of dictionaries (each dictionary representing a row).
         header: A list of keys to be used as the header row.
-    """
-    try:
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=header)  # Use DictWriter
-            writer.writeheader()
-            writer.writerows(data)
-    except Exception as e:
-        print(f"Error writing to CSV {filepath}: {e}")
-
-def create_csvs_from_json(json_file, users_csv, tweets_csv, highlight_tweets_csv):
-    """Creates users, tweets, and highlight_tweets CSV files from a JSON file.
+        mode: 'w' to start a new file, 'a' to append to an existing one.
 
-    Args:
-        json_file: Path to the input JSON file.
-        users_csv: Path to the output users CSV file.
-        tweets_csv: Path to the output tweets CSV file.
-        highlight_tweets_csv: Path to the output highlight tweets CSV file.
+    Returns:
+        The open file, and a function that writes a list of dictionaries (each dictionary representing a row) to it.
     """
+    f = stack.enter_context(open(filepath, mode, newline='', encoding='utf-8'))
+    writer = csv.writer(f)
+    if f.tell() == 0:
+        writer.writerow(header)
+    # Picks every column of a row in one call, in header order
+    get_columns = itemgetter(*header)
+
+    def write_rows(rows):
+        writer.writerows(map(get_columns, rows))
+
+    return f, write_rows
+
+def write_jsonl(f, rows):
+    """Appends rows to a JSONL file opened in binary mode, one JSON object per line, and flushes it."""
+    for row in rows:
+        f.write(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE))
+    f.flush()
+
+def load_done_usernames(filepath):
+    """Returns the lowercased screen names recorded in the checkpoint file, if there is one."""
+    done_usernames = set()
     try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        if data['users']:
-            write_data_to_csv(users_csv, data['users'], list(data['users'][0].keys()))
-        if data['tweets']:
-            write_data_to_csv(tweets_csv, data['tweets'], list(data['tweets'][0].keys()))
-        if data['highlight_tweets']:
-            write_data_to_csv(highlight_tweets_csv, data['highlight_tweets'], list(data['highlight_tweets'][0].keys()))
-
+        with open(filepath, 'rb') as f:
+            for line in f:
+                try:
+                    done_usernames.add(orjson.loads(line)['screen_name'].lower())
+                except (orjson.JSONDecodeError, KeyError, TypeError, AttributeError):
+                    # Most likely a line cut off when the previous run was stopped
+                    continue
     except FileNotFoundError:
-        print(f"Error: JSON file not found at {json_file}")
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON format in {json_file}")
-    except KeyError as e:
-        print(f"Error: Missing key in JSON data: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        pass
+    return done_usernames
 
 async def main():
     console_logger.info("Starting Twitter data fetching script...")
@@ -303,58 +436,86 @@ async def main():
             return
         console_logger.info("Login successful.")
 
-        usernames = []
+        user_id_cache.load()
+
+        done_usernames = load_done_usernames(DONE_FILE)
+        if done_usernames:
+            console_logger.info(f"Resuming: skipping {len(done_usernames)} users already listed in '{DONE_FILE}'.")
+
+        def iter_pending_usernames():
+            for username in iter_usernames(USERNAMES_FILE):
+                if username.lower() not in done_usernames:
+                    yield username
+
         try:
-            with open('usernames.txt', 'r') as f:
-                usernames = [line.strip() for line in f]
+            # Only counts the usernames for the progress bar, they are read again lazily below
+            total_users = sum(1 for _ in iter_pending_usernames())
         except FileNotFoundError:
-            logging.error("Usernames file 'usernames.txt' not found.")
+            logging.error(f"Usernames file '{USERNAMES_FILE}' not found.")
             return
 
-        all_data = {"users": [], "tweets": [], "highlight_tweets": []}
-
-        with tqdm(usernames, desc="Fetching data", unit="user", bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}  [{elapsed} taken, {remaining} remaining]') as progress_bar:
-            for username in progress_bar:
-                retries = 0
-                wait_time = INITIAL_WAIT_TIME
-                while retries < MAX_RETRIES:
-                    try:
-                        user_data, tweets_data, highlight_tweets_data = await fetch_user_data(username)
-                        if user_data:
-                            all_data["users"].append(user_data)
-                            all_data["tweets"].extend(tweets_data)
-                            all_data["highlight_tweets"].extend(highlight_tweets_data)
-                        break  # Successfully fetched, so break retry loop
-                    except TooManyRequests:
-                        progress_bar.set_description(f"Rate limited: {username}")
-                        logging.warning(f"User: {username} - TooManyRequests error. Retrying in {wait_time} seconds... {retries + 1} retries done")
-                        retries += 1
-                        try:
-                            await asyncio.wait_for(asyncio.sleep(wait_time), timeout=wait_time + 10)
-                        except asyncio.TimeoutError:
-                            logging.error("asyncio.sleep() timed out!")
-                        wait_time = wait_time * BACKOFF_FACTOR + random.uniform(-5, 5)
-                    except Exception as e:
-                        progress_bar.set_description(f"Error: {username}")
-                        logging.error(f"User: {username} - An unexpected error occurred while fetching data: {e}")
-                        break  # Break retry loop for other exceptions
-
-                await asyncio.sleep(random.uniform(SLEEP_BETWEEN_USERS_MIN, SLEEP_BETWEEN_USERS_MAX))
-
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as outfile:
-            json.dump(all_data, outfile, indent=4, ensure_ascii=False)
-        console_logger.info(f"Data fetching complete. Output saved to '{OUTPUT_FILE}'.")
-
-        # Convert JSON to CSV after successful JSON creation
-        create_csvs_from_json(OUTPUT_FILE, USERS_CSV_FILE, TWEETS_CSV_FILE, HIGHLIGHT_TWEETS_CSV_FILE)
-        console_logger.info(f"Data converted to CSV format. Users saved to '{USERS_CSV_FILE}', Tweets to '{TWEETS_CSV_FILE}', and Highlight Tweets to '{HIGHLIGHT_TWEETS_CSV_FILE}'.")
+        # A resumed run adds to the output of the previous ones instead of starting new files
+        mode = 'a' if done_usernames else 'w'
+        with ExitStack() as stack:
+            users_csv_file, write_users = open_csv_writer(stack, USERS_CSV_FILE, USER_FIELDS, mode)
+            tweets_csv_file, write_tweets = open_csv_writer(stack, TWEETS_CSV_FILE, TWEET_FIELDS, mode)
+            highlight_tweets_csv_file, write_highlight_tweets = open_csv_writer(stack, HIGHLIGHT_TWEETS_CSV_FILE, HIGHLIGHT_TWEET_FIELDS, mode)
+            if SAVE_JSONL:
+                users_file = stack.enter_context(open(USERS_JSONL_FILE, mode + 'b'))
+                tweets_file = stack.enter_context(open(TWEETS_JSONL_FILE, mode + 'b'))
+                highlight_tweets_file = stack.enter_context(open(HIGHLIGHT_TWEETS_JSONL_FILE, mode + 'b'))
+            done_file = stack.enter_context(open(DONE_FILE, mode + 'b'))
+
+            progress_bar = stack.enter_context(tqdm(total=total_users, desc="Fetching data", unit="user", bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}  [{elapsed} taken, {remaining} remaining]'))
+            username_queue = asyncio.Queue(maxsize=CONCURRENCY * 4)
+
+            async def produce_usernames():
+                for username in iter_pending_usernames():
+                    await username_queue.put(username)
+                for _ in range(CONCURRENCY):
+                    await username_queue.put(None)  # Tells one worker to stop
+
+            async def fetch_users():
+                while True:
+                    username = await username_queue.get()
+                    if username is None:
+                        break
+                    result = await try_fetch_user_data(username, progress_bar)
+                    progress_bar.update(1)
+                    if not result:
+                        continue
+                    # Writing does not await, so results from different workers never interleave
+                    user_data, tweets_data, highlight_tweets_data = result
+                    if user_data:
+                        write_users([user_data])
+                        write_tweets(tweets_data)
+                        write_highlight_tweets(highlight_tweets_data)
+                        if SAVE_JSONL:
+                            write_jsonl(users_file, [user_data])
+                            write_jsonl(tweets_file, tweets_data)
+                            write_jsonl(highlight_tweets_file, highlight_tweets_data)
+                        # The user only counts as done once all of its rows are on disk
+                        users_csv_file.flush()
+                        tweets_csv_file.flush()
+                        highlight_tweets_csv_file.flush()
+                        write_jsonl(done_file, [{'screen_name': username, 'user_id': user_data['id']}])
+
+            await asyncio.gather(produce_usernames(), *[fetch_users() for _ in range(CONCURRENCY)])
+
+        console_logger.info(f"Data fetching complete. Users saved to '{USERS_CSV_FILE}', Tweets to '{TWEETS_CSV_FILE}', and Highlight Tweets to '{HIGHLIGHT_TWEETS_CSV_FILE}'.")
+        if SAVE_JSONL:
+            console_logger.info(f"JSON Lines output saved to '{USERS_JSONL_FILE}', '{TWEETS_JSONL_FILE}' and '{HIGHLIGHT_TWEETS_JSONL_FILE}'.")
 
     except KeyboardInterrupt:
         console_logger.info("Script interrupted by user.")
     except asyncio.exceptions.CancelledError:
         console_logger.info("Script Cancelled by user")
     finally:
+        user_id_cache.save()
         console_logger.info("Exiting the script...")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
\ No newline at end of file